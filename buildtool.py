@@ -1,41 +1,75 @@
 #!/usr/bin/env python3
 
 import os
+import collections
+import ctypes
+import errno
+import filecmp
 import json
 import hashlib
 import subprocess
 import shlex
-import argparse
+import shutil
+import mmap
+import selectors
+import atexit
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import re
 from datetime import datetime
 import time
-from typing import Dict, Set
+from typing import ClassVar, Dict, Set
 import pathlib
 from enum import Enum, StrEnum
 from functools import cache
+from dataclasses import dataclass
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(data):
+    # orjson parses bytes or str with a C state machine; both decoders
+    # raise a ValueError subclass on corrupt input
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
 ROOT = os.path.dirname(os.path.realpath(sys.argv[0]))
 
-DEBUG_LOG = False
+# bump to invalidate .info files written with an older digest/layout
+INFO_VERSION = 3
+
+# below this size the mmap setup costs more than it saves
+MMAP_HASH_THRESHOLD = 1 << 16
 
-VCPKG_INCLUDE_RE = r"^vcpkg\/installed\/[a-z0-9-]+\/include\/([^\/]+)\/"
+DEBUG_LOG = bool(os.environ.get('BUILDTOOL_DEBUG'))
 
-CCFLAGS = ["-pthread", "-fnon-call-exceptions", "-g",
-            "-Wall", "-Wextra", "-Wconversion", 
+VCPKG_INCLUDE_PAT = re.compile(r"^vcpkg\/installed\/[a-z0-9-]+\/include\/([^\/]+)\/")
+CLANG_HEADERUNIT_PAT = re.compile(r'^.*:\d+:\d+: error: header file (["<])([a-zA-Z0-9\-_.\/]+)[">] \(aka \'([a-zA-Z0-9\-_.\/]+)\'\) cannot be imported because it is not known to be a header unit$')
+
+# tuples: frozen after startup, hashable for @cache keys, and cheaper
+# to splat into the per-TU argv than rebuilding lists
+CCFLAGS = ("-pthread", "-fnon-call-exceptions", "-g",
+            "-Wall", "-Wextra", "-Wconversion",
             "-Wno-sign-compare", "-Wno-deprecated", "-Wno-sign-conversion",
             "-Werror=shift-count-overflow",
             "-Werror=return-type",
-]
-CXXFLAGS = ["-std=c++23"]
-LFLAGS = ["-lrt"]
+)
+CXXFLAGS = ("-std=c++23",)
+LFLAGS = ("-lrt",)
 OBJDIR = "obj"
 DEPDIR = "obj"
 SUFFIX = ""
 
 SRCDIR = "."
 BINDIR = "bin"
-INCPATH = []
+INCPATH = ()
 USECLANG = False
 
 CXX = "clang++" if USECLANG else "g++"
@@ -43,23 +77,33 @@ CC = "clang" if USECLANG else "gcc"
 
 TESTMAIN = "deps/baselib/lib/testing/testmain.cc"
 
-class Release:
-    CCFLAGS = CCFLAGS + ["-O2", "-mtune=native"]
-    LFLAGS  = LFLAGS + ["-fwhole-program", "-O2", "-mtune=native"]
-    OBJDIR  = OBJDIR + "/release"
-    DEPDIR  = DEPDIR + "/release"
-
-
-class Debug:
-    CCFLAGS = CCFLAGS + ["-fsanitize=address"]
-    OBJDIR  = OBJDIR + "/debug"
-    DEPDIR  = DEPDIR + "/debug"
-    SUFFIX  = "+debug"
+@dataclass(slots=True)
+class BuildConfig:
+    ccflags: tuple
+    lflags:  tuple
+    objdir:  str
+    depdir:  str
+    suffix:  str = SUFFIX
+
+Release = BuildConfig(
+    ccflags = CCFLAGS + ("-O2", "-mtune=native"),
+    lflags  = LFLAGS + ("-fwhole-program", "-O2", "-mtune=native"),
+    objdir  = OBJDIR + "/release",
+    depdir  = DEPDIR + "/release",
+)
+
+Debug = BuildConfig(
+    ccflags = CCFLAGS + ("-fsanitize=address",),
+    lflags  = LFLAGS,
+    objdir  = OBJDIR + "/debug",
+    depdir  = DEPDIR + "/debug",
+    suffix  = "+debug",
+)
 
 ## =========================================================== ##
 
 CCFILE_SUFFIXES = ('.cc', '.cpp')
-HFILE_SUFFIXES  = ('.h', '.hpp', '.hh')
+HFILE_SUFFIXES  = frozenset({'.h', '.hpp', '.hh'})
 
 THIS_MTIME = 0
 
@@ -75,6 +119,124 @@ class SourceType(StrEnum):
     GENERATED_HEADER = 'generated header'
     MODULE           = 'module'
 
+# shared stat cache: one scandir per directory instead of one stat per
+# touch, since Path instances are constructed anew all over the place
+_STAT_CACHE = {}
+_SCANNED_DIRS: Set[str] = set()
+_MISSING = object()
+
+def _prescan(dirname: str):
+    if dirname in _SCANNED_DIRS:
+        return
+    _SCANNED_DIRS.add(dirname)
+    try:
+        entries = os.scandir(dirname or '.')
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                _STAT_CACHE.setdefault(os.path.normpath(entry.path), entry.stat())
+            except OSError:
+                pass
+
+def stat_cache_invalidate(path):
+    _STAT_CACHE.pop(str(path), None)
+
+# mtime-only statx: AT_STATX_DONT_SYNC lets network filesystems answer
+# from cached attributes instead of round-tripping to the server, and
+# STATX_MTIME asks for just the one field we want
+_AT_FDCWD           = -100
+_AT_STATX_DONT_SYNC = 0x4000
+_STATX_MTIME        = 0x0040
+
+class _StatxTimestamp(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_int64),
+                ('tv_nsec', ctypes.c_uint32),
+                ('_reserved', ctypes.c_int32)]
+
+class _Statx(ctypes.Structure):
+    _fields_ = [('stx_mask', ctypes.c_uint32),
+                ('stx_blksize', ctypes.c_uint32),
+                ('stx_attributes', ctypes.c_uint64),
+                ('stx_nlink', ctypes.c_uint32),
+                ('stx_uid', ctypes.c_uint32),
+                ('stx_gid', ctypes.c_uint32),
+                ('stx_mode', ctypes.c_uint16),
+                ('_spare0', ctypes.c_uint16),
+                ('stx_ino', ctypes.c_uint64),
+                ('stx_size', ctypes.c_uint64),
+                ('stx_blocks', ctypes.c_uint64),
+                ('stx_attributes_mask', ctypes.c_uint64),
+                ('stx_atime', _StatxTimestamp),
+                ('stx_btime', _StatxTimestamp),
+                ('stx_ctime', _StatxTimestamp),
+                ('stx_mtime', _StatxTimestamp),
+                ('stx_rdev_major', ctypes.c_uint32),
+                ('stx_rdev_minor', ctypes.c_uint32),
+                ('stx_dev_major', ctypes.c_uint32),
+                ('stx_dev_minor', ctypes.c_uint32),
+                ('stx_mnt_id', ctypes.c_uint64),
+                ('stx_dio_mem_align', ctypes.c_uint32),
+                ('stx_dio_offset_align', ctypes.c_uint32),
+                ('_spare3', ctypes.c_uint64 * 12)]
+
+# the syscall copies the full struct regardless of the requested mask
+assert ctypes.sizeof(_Statx) == 256
+
+try:
+    _statx = ctypes.CDLL(None, use_errno=True).statx
+except (OSError, AttributeError):
+    _statx = None
+
+def _fast_mtime(path: str) -> int:
+    # integer nanoseconds, 0 when missing, like Path.mtime
+    global _statx
+    if _statx is not None:
+        buf = _Statx()
+        ret = _statx(_AT_FDCWD, os.fsencode(path), _AT_STATX_DONT_SYNC,
+                     _STATX_MTIME, ctypes.byref(buf))
+        if ret == 0:
+            return buf.stx_mtime.tv_sec * 1_000_000_000 + buf.stx_mtime.tv_nsec
+        err = ctypes.get_errno()
+        if err != errno.ENOSYS:
+            return 0
+        _statx = None  # kernel too old; don't retry per call
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+@cache
+def _dir_listing(dirname: str) -> frozenset:
+    # one readdir per directory instead of a string of ENOENT stat probes
+    try:
+        return frozenset(os.listdir(dirname or '.'))
+    except OSError:
+        return frozenset()
+
+# compiles and hashing are subprocess/IO bound, so threads suffice
+_EXECUTOR = None
+_REGISTRY_LOCK = threading.RLock()
+
+def get_executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count())
+    return _EXECUTOR
+
+def parallel_each(fn, items):
+    # fan out only from the main thread: nested submission from workers
+    # could exhaust the pool and deadlock, so they run inline instead
+    items = list(items)
+    if len(items) <= 1 or threading.current_thread() is not threading.main_thread():
+        for item in items:
+            fn(item)
+        return
+    futures = [get_executor().submit(fn, item) for item in items]
+    for future in futures:
+        future.result()
+
 # https://stackoverflow.com/q/29850801/
 BasePath = type(pathlib.Path())
 class Path(BasePath):
@@ -84,24 +246,55 @@ class Path(BasePath):
 
     def with_extra_suffix(self, suffix: str) -> 'Path':
         return self.with_name(self.name + suffix)
-    
-    @cache
+
     def stat(self):
-        try:
-            return super().stat()
-        except FileNotFoundError:
-            return None
-        
+        # no per-instance @cache: Path objects are constructed fresh all
+        # over, so only the shared dict gives real hits, and an instance
+        # cache would keep serving entries stat_cache_invalidate dropped
+        key = str(self)
+        st = _STAT_CACHE.get(key, _MISSING)
+        if st is _MISSING:
+            _prescan(os.path.dirname(key))
+            st = _STAT_CACHE.get(key, _MISSING)
+            if st is _MISSING:
+                # not seen by the scan (created since, or invalidated)
+                try:
+                    st = os.stat(key)
+                except OSError:
+                    st = None
+            _STAT_CACHE[key] = st
+        return st
+
     def mtime(self):
+        # integer nanoseconds: float st_mtime loses precision on
+        # ns-resolution filesystems, which can mask or fake staleness
         stat = self.stat()
         if stat is None:
             return 0
-        return stat.st_mtime
+        return stat.st_mtime_ns
     
     def exists(self):
         return self.stat() is not None
 
 
+# wrap the config paths once at import; re-wrapping them with Path(...)
+# on every invocation in main() was pure re-construction of the same
+# values
+SRCDIR = Path(SRCDIR)
+BINDIR = Path(BINDIR)
+Release.objdir = Path(Release.objdir)
+Release.depdir = Path(Release.depdir)
+Debug.objdir = Path(Debug.objdir)
+Debug.depdir = Path(Debug.depdir)
+
+
+def strip_suffix(s: str) -> str:
+    # str analogue of Path.with_suffix(''): cheaper than a pathlib
+    # round-trip when building several sibling artifact paths
+    dot = s.rfind('.')
+    return s[:dot] if dot > s.rfind('/') + 1 else s
+
+
 class Target:
     def __init__(self, path: Path, targettype: TargetType):
         self.path = path
@@ -111,36 +304,41 @@ class Target:
         self.processed_files = set()
         self.configs = set()
         self.most_recent_output_mtime = 0
-        self.extra_linkflags = set()
+        self.extra_linkflags = []
+        self._linkflag_set = set()
+        self._linkflags_cached = None
+        self.lock = threading.Lock()
 
     def compile(self, path: Path, modname: str=None):
         if path.suffix in CCFILE_SUFFIXES:
             type = SourceType.CPP
-        elif path.suffix in ('.c'):
+        elif path.suffix == '.c':
             type = SourceType.C
         else:
             warn("uncrecognized file type: %s" % path)
             exit(1)
-        
+
         file = SourceFile.get(path, type, modname)
-        if file in self.processed_files:
-            return
-        self.processed_files.add(file)
+        with self.lock:
+            if file in self.processed_files:
+                return file
+            self.processed_files.add(file)
 
         debug_log(f"processing {path} type={type}")
         file.build(self)
 
-        #if type not in [SourceType.SYSTEM_HEADER, SourceType.USER_HEADER]:
-        self.objs.append(file.objpath)
+        with self.lock:
+            #if type not in [SourceType.SYSTEM_HEADER, SourceType.USER_HEADER]:
+            self.objs.append(file.objpath)
+
+            if file.output_mtime > self.most_recent_output_mtime:
+                self.most_recent_output_mtime = file.output_mtime
 
-        if file.output_mtime > self.most_recent_output_mtime:
-            self.most_recent_output_mtime = file.output_mtime
-        
         return file
 
     def link(self):
         dirname = self.path.parent
-        buildvars = DirectoryConfig.get(dirname).buildvars
+        buildvars = get_dircfg(dirname).buildvars
 
         suffix = SUFFIX
         extra_flags = []
@@ -154,48 +352,184 @@ class Target:
         if self.most_recent_output_mtime >= ofile_mtime or THIS_MTIME > ofile_mtime:
             lflags = self.get_linkflags()
             print("LINKING", self.path)
-            shell(CXX, *CCFLAGS, *extra_flags, *self.objs, *lflags, f"-o{ofile}")
+            shell_run(CXX, *CCFLAGS, *extra_flags, *self.objs, *lflags, f"-o{ofile}")
+            stat_cache_invalidate(ofile)
+        self.record_inputs(ofile)
         return ofile
 
+    def record_inputs(self, ofile: Path):
+        # flatten everything that can invalidate this binary — sources,
+        # their recorded file/include deps, and the directories whose
+        # BUILD.py feeds the flags — so the next invocation can answer
+        # the nothing-changed case with stats alone
+        inputs = set()
+        manifest = INFO_MANIFEST.load()
+        for file in self.processed_files:
+            inputs.add(str(file.path))
+            record = manifest.get(str(file.path))
+            if record:
+                for depname in record['deps']:
+                    kind, _, dep = depname.partition(':')
+                    if kind in ('file', 'include'):
+                        inputs.add(dep)
+        for config in self.configs:
+            # the directory mtime covers BUILD.py appearing or vanishing
+            inputs.add(os.fspath(config.dir))
+            buildfile = config.dir / 'BUILD.py'
+            if buildfile.exists():
+                inputs.add(os.fspath(buildfile))
+        TARGET_MANIFEST.load()[str(ofile)] = sorted(inputs)
+        TARGET_MANIFEST.dirty = True
+
     def add_config(self, config):
-        if config in self.configs:
-            return
-        self.configs.add(config)
+        with self.lock:
+            if config in self.configs:
+                return
+            self.configs.add(config)
 
-        if config.linkflags:
-            self.extra_linkflags.update(config.linkflags)
+            # dedupe at insertion: O(1) membership per flag, and no
+            # throwaway dict per link later
+            for flag in config.linkflags:
+                if flag not in self._linkflag_set:
+                    self._linkflag_set.add(flag)
+                    self.extra_linkflags.append(flag)
+                    self._linkflags_cached = None
 
 
     def get_linkflags(self):
-        lflags = set(LFLAGS)
-        lflags.update(self.extra_linkflags)
-
-        extra = []
-
-        for flag in lflags:
+        # keep the link line deterministic: set iteration order used to
+        # vary between runs, which could relink for no reason
+        if self._linkflags_cached is not None:
+            return self._linkflags_cached
+
+        seen = set()
+        lflags = []
+        for flag in (*LFLAGS, *self.extra_linkflags):
+            if flag not in seen:
+                seen.add(flag)
+                lflags.append(flag)
+        for flag in tuple(lflags):
             if flag.startswith('-L'):
-                rpath_flag = '-Wl,-rpath,' + flag[2:]
-                extra.append(rpath_flag)
+                rflag = '-Wl,-rpath,' + flag[2:]
+                if rflag not in seen:
+                    seen.add(rflag)
+                    lflags.append(rflag)
 
-        lflags.update(extra)
+        self._linkflags_cached = lflags
         return lflags
         
 
+# absolute path of ccache when found on PATH (set in main)
+CCACHE = None
+
+def ccache_prefix(type: SourceType) -> tuple:
+    # only plain C compiles are safe to wrap: the modules-ts paths talk
+    # to the driver over mapper fds / module outputs ccache cannot cache
+    if CCACHE and type == SourceType.C:
+        return (CCACHE,)
+    return ()
+
+@cache
+def gcc_argv_prefix(type: SourceType) -> tuple:
+    # the leading argv segment is constant per SourceType for the whole
+    # run (flags are frozen before the first compile), so build each one
+    # once instead of re-concatenating constant sublists per file
+    cmd = CC if type == SourceType.C else CXX
+    if type == SourceType.SYSTEM_HEADER:
+        return (cmd, "-fmodules-ts", "-fmodule-header=system", "-I.", *CXXFLAGS)
+    if type == SourceType.USER_HEADER:
+        return (cmd, "-fmodules-ts", "-fmodule-header=user", "-iquote.", *CXXFLAGS)
+    if type == SourceType.CPP:
+        return (cmd, "-fmodules-ts", *CXXFLAGS)
+    return (*ccache_prefix(type), cmd)
+
+@cache
+def clang_argv_parts(type: SourceType) -> tuple:
+    # invariant (head, tail) halves of the clang argv per SourceType:
+    # OBJDIR and the flag tuples are frozen before the first command is
+    # assembled, so per-file work reduces to the -o/-MF/source tokens
+    prebuilt = f"-fprebuilt-module-path={OBJDIR}"
+    if type == SourceType.USER_HEADER:
+        return ((CXX, "-xc++-header", "-fmodule-header=user", prebuilt,
+                 *CCFLAGS, *CXXFLAGS, *INCPATH), ())
+    if type == SourceType.MODULE:
+        return ((CXX, prebuilt), (*CCFLAGS, *INCPATH))
+    return ((CXX, prebuilt), (*CCFLAGS, *CXXFLAGS, *INCPATH))
+
+@cache
+def compiler_extra_args_for(dirname: Path, type: SourceType) -> tuple:
+    # every TU in a directory shares these flags, so assemble them once
+    # per (directory, language) instead of per file; the ordered-dedupe
+    # tuple also keeps the argv deterministic across runs (set iteration
+    # order is hash-randomized, which would churn the cmdhash
+    # fingerprint and recompile for no reason)
+    flags = []
+
+    buildvars = get_dircfg(dirname).buildvars
+    if 'CFLAGS' in buildvars:
+        # -I -> -idirafter is an anchored prefix swap; no regex needed
+        flags += ['-idirafter' + flag[2:] if flag.startswith('-I') else flag
+                  for flag in buildvars['CFLAGS']]
+
+    dirparts = list(dirname.parts)
+    try:
+        src_index = dirparts.index('src')
+        dirparts[src_index] = 'include'
+        flags.append("-I" + str(Path(*dirparts)))
+    except ValueError:
+        pass
+
+    if type == SourceType.C:
+        flags.append("-xc")
+
+    return tuple(dict.fromkeys(flags))
+
+
 class SourceFile:
+    # tens of thousands of instances on big trees: no per-instance dict
+    __slots__ = ('path', 'dirname', 'type', 'modname', 'processed',
+                 'output_mtime', 'objpath', 'cmpath', 'output_path',
+                 'makefile', 'mtime', 'deps', 'up_to_date', 'lock', 'done',
+                 'need_recompile', 'header_deps', 'vcpkgs')
+
     files = {}
+    known_header_units: Set[Path] = set()
 
     @staticmethod
     def get(path: Path, type: SourceType=None, modname: str=None):
-        file = SourceFile.files.get(path)
-        if file:
-            if type and file.type and type != file.type:
-                raise Exception(f"type mismatch: new type {type}; old type {file.type}")
-            if modname and file.modname and modname != file.modname:
-                raise Exception("modname mismatch")
+        # keyed by normalized string: str hashing is much cheaper than
+        # Path hashing and the instances are constructed fresh anyway.
+        # Path normalizes on construction; raw strings must be normalized
+        # here or "./x.cc" and "x.cc" would intern separately
+        key = os.fspath(path)
+        if not isinstance(path, Path):
+            key = os.path.normpath(key)
+        with _REGISTRY_LOCK:
+            file = SourceFile.files.get(key)
+            if file:
+                if type and file.type and type != file.type:
+                    raise Exception(f"type mismatch: new type {type}; old type {file.type}")
+                if modname and file.modname and modname != file.modname:
+                    raise Exception("modname mismatch")
+                # files pre-registered without type/modname (e.g. by the
+                # compilation database) learn them here; the dependent
+                # artifact paths must follow
+                backfilled = False
+                if modname and file.modname is None:
+                    file.modname = modname
+                    file.cmpath = OBJDIR / mod2cm(modname)
+                    backfilled = True
+                if type and file.type is None:
+                    file.type = type
+                    backfilled = True
+                if backfilled:
+                    file.output_path = file.cmpath if file.type in [SourceType.USER_HEADER, SourceType.SYSTEM_HEADER, SourceType.GENERATED_HEADER] else file.objpath
+                return file
+            if not isinstance(path, Path):
+                path = Path(path)
+            file = SourceFile(path, type, modname)
+            SourceFile.files[key] = file
             return file
-        file = SourceFile(path, type, modname)
-        SourceFile.files[path] = file
-        return file
 
     def __init__(self, path: Path, type: SourceType, modname: str):
         self.path         = path
@@ -205,108 +539,128 @@ class SourceFile:
         self.processed    = False
         self.output_mtime = 0
 
+        # one shared string stem instead of a relative_to/with_suffix/join
+        # pathlib round-trip per artifact: this runs for every TU
         file             = path.relative_to(SRCDIR)
-        self.objpath     = OBJDIR / file.with_suffix('.o')
+        stem             = os.fspath(OBJDIR) + '/' + strip_suffix(os.fspath(file))
+        self.objpath     = Path(stem + '.o')
 
         if modname:
             self.cmpath  = OBJDIR / mod2cm(modname)
         else:
-            self.cmpath  = OBJDIR / file.with_suffix(".pcm")
+            self.cmpath  = Path(stem + '.pcm')
 
         self.output_path = self.cmpath if self.type in [SourceType.USER_HEADER, SourceType.SYSTEM_HEADER, SourceType.GENERATED_HEADER] else self.objpath
-        self.infofile    = OBJDIR / file.with_suffix(".info")
-        self.makefile    = OBJDIR / file.with_suffix(".make")
+        self.makefile    = Path(stem + '.make')
         self.mtime       = self.path.mtime()
         self.deps        = set()
         self.up_to_date  = None
+        self.lock        = threading.Lock()
+        self.done        = threading.Event()
+        self.need_recompile = False
+        self.header_deps = set()
+        self.vcpkgs      = set()
 
     def check_up_to_date(self):
         if self.up_to_date is not None:
             return
-        
-        infofile_mtime = self.infofile.mtime()
-        if self.mtime >= infofile_mtime:
-            self.up_to_date = False
-            self.need_recompile = True
-            debug_log(f"#{self.path} NEED RECOMPILE BECAUSE MTIME={self.mtime} > INFOFILE_MTIME={infofile_mtime}")
-            return
-        
-        self.output_mtime = infofile_mtime
-        
-        try:
-            with open(self.infofile, 'r') as f:
-                data = json.load(f)
-        except FileNotFoundError:
+
+        record = INFO_MANIFEST.load().get(str(self.path))
+        if record is None or record.get('version') != INFO_VERSION:
             self.up_to_date = False
             self.need_recompile = True
             return
-        
-        if data['command'] != self.compiler_cmd():
+
+        stamp = record['stamp']
+        if self.mtime >= stamp:
+            # a newer mtime is often just a touch (checkout, rebase):
+            # if the bytes still match the recorded digest, refresh the
+            # stamp instead of recompiling this TU and its dependents
+            srchash = record.get('srchash')
+            if srchash is not None and fast_hash_file(self.path) == srchash:
+                record['stamp'] = time.time_ns()
+                INFO_MANIFEST.dirty = True
+            else:
+                self.up_to_date = False
+                self.need_recompile = True
+                debug_log(f"#{self.path} NEED RECOMPILE BECAUSE MTIME={self.mtime} > STAMP={stamp}")
+                return
+
+        self.output_mtime = stamp
+
+        if record['cmdhash'] != argv_fingerprint(self.compiler_cmd()):
             self.up_to_date = False
             self.need_recompile = True
-            debug_log("compiler command changed %s != %s" % (data['command'], self.compiler_cmd()))
+            debug_log("compiler command changed for %s" % self.path)
             return
-        
-        self.need_recompile = False
-        for depname in data['deps']:
-            if depname.startswith('file:'):
-                dep = depname[5:]
 
-                if SourceFile.get(dep).mtime >= infofile_mtime:
+        self.need_recompile = False
+        for depname in record['deps']:
+            # one partition scan replaces three prefix probes plus the
+            # regex trip for modules; this loop runs per dep per TU
+            tag, _, payload = depname.partition(':')
+            if tag == 'file':
+                if SourceFile.get(payload).mtime >= stamp:
                     self.up_to_date     = False
                     self.need_recompile = True
 
-            elif depname.startswith('module:'):
-                m = re.match(r'module:(.*)@(.*)', depname)
-                name, sha256 = m.groups()
-                self.deps.add(ModuleDep(name, sha256))
+            elif tag == 'module':
+                name, _, digest = payload.rpartition('@')
+                self.deps.add(ModuleDep(name, digest))
                 self.up_to_date = False
 
-            elif depname.startswith('include:'):
-                dep = depname[8:]
-                hfile = HeaderDep.get(Path(dep))
+            elif tag == 'include':
+                hfile = HeaderDep.get(Path(payload))
                 self.up_to_date = False
-                if hfile.mtime() >= infofile_mtime:
+                if hfile.mtime() >= stamp:
                     self.need_recompile = True
                 self.deps.add(hfile)
 
             else:
                 raise Exception(f"unrecognized dep type: {depname}")
-            
+
         if self.up_to_date is None:
             self.up_to_date = True
 
     def build(self, target):
-        if self.processed:
-            return
-        self.processed = True
+        # claim-and-return: header dep graphs may be cyclic, so a file that
+        # is already being built elsewhere is not waited for here; module
+        # consumers wait on self.done instead (module graphs are acyclic)
+        with self.lock:
+            if self.processed:
+                return
+            self.processed = True
 
-        target.add_config(self.dircfg())
+        try:
+            target.add_config(self.dircfg())
 
-        self.check_up_to_date()
-        if self.up_to_date:
-            return
-        
-        if self.need_recompile:
-            objdir = self.objpath.parent
-            os.makedirs(objdir, exist_ok=True)
-            self.compile(target)
-            self.update()
-            self.output_mtime = time.time()
+            self.check_up_to_date()
+            if self.up_to_date:
+                return
 
-            for header_dep in self.header_deps:
-                header_dep.build(target)
+            if self.need_recompile:
+                objdir = self.objpath.parent
+                os.makedirs(objdir, exist_ok=True)
+                self.compile(target)
+                for output in (self.objpath, self.cmpath, self.makefile):
+                    stat_cache_invalidate(output)
+                self.update()
+                self.output_mtime = time.time_ns()
 
-        else:
-             self.build_deps(target)
+                parallel_each(lambda dep: dep.build(target), self.header_deps)
+
+            else:
+                self.build_deps(target)
+        finally:
+            self.done.set()
 
     def build_deps(self, target):
-        for dep in self.deps:
+        def build_one(dep):
             if isinstance(dep, ModuleDep):
                 mod = CompiledModule.get(dep.name)
                 new_hash = mod.build(target)
 
-                if new_hash != dep.sha256:
+                if new_hash != dep.digest:
                     self.need_recompile = True
 
             elif isinstance(dep, HeaderDep):
@@ -315,28 +669,73 @@ class SourceFile:
             else:
                 raise Exception(f"unrecognized dep {dep}")
 
-    def update(self):
+        parallel_each(build_one, self.deps)
+
+    def serialize_deps(self):
         deps = []
         for dep in self.deps:
 
             if isinstance(dep, ModuleDep):
-                deps.append(f"module:{dep.name}@{dep.sha256}")
+                deps.append(f"module:{dep.name}@{dep.digest}")
 
-            if isinstance(dep, HeaderDep):
+            elif isinstance(dep, HeaderDep):
                 deps.append(f"include:{dep.path}")
 
             else:
                 raise Exception(f"unhandled dep type #{dep} of type #{type(dep)}")
 
-        out = {
-            'command': self.compiler_cmd(),
-            'deps': deps
+        return deps
+
+    def object_cache_key(self, depnames=None):
+        # content-addressed key over the command line, the source bytes
+        # and every dependency's bytes; defaults to the dep list the
+        # previous build recorded (ccache's direct mode). None when the
+        # deps are unknown or a dep has vanished.
+        if depnames is None:
+            record = INFO_MANIFEST.load().get(str(self.path))
+            if record is None or record.get('version') != INFO_VERSION:
+                return None
+            depnames = record['deps']
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(argv_fingerprint(self.compiler_cmd()).encode())
+
+        entries = []
+        paths = [self.path]
+        for depname in sorted(depnames):
+            kind, _, dep = depname.partition(':')
+            if kind in ('file', 'include'):
+                path = Path(dep)
+                paths.append(path)
+                entries.append((depname, str(path)))
+            else:
+                # module deps already carry a content digest
+                entries.append((depname, None))
+
+        # one batched pass over the source and its file deps: cold-cache
+        # hashing fans out on the shared pool
+        try:
+            digests = fast_hash_files(paths)
+        except OSError:
+            return None
+
+        h.update(digests[str(self.path)].encode())
+        for depname, key in entries:
+            h.update((digests[key] if key else depname).encode())
+        return h.hexdigest()
+
+    def update(self):
+        INFO_MANIFEST.load()[str(self.path)] = {
+            'version': INFO_VERSION,
+            'stamp': time.time_ns(),
+            'cmdhash': argv_fingerprint(self.compiler_cmd()),
+            'srchash': fast_hash_file(self.path),
+            'deps': self.serialize_deps()
         }
-        atomic_write(self.infofile, json.dumps(out, indent=2) + '\n')
+        INFO_MANIFEST.dirty = True
 
-    @cache
     def dircfg(self):
-        return DirectoryConfig.get(self.dirname)
+        return get_dircfg(self.dirname)
 
     @cache
     def compiler_cmd(self):
@@ -347,75 +746,33 @@ class SourceFile:
 
         return cmd
     
-    IFLAG_RE = re.compile('^-I')
     def compiler_extra_args(self):
-        flags = set()
-
-        buildvars = self.dircfg().buildvars
-        if 'CFLAGS' in buildvars:
-            cflags = buildvars['CFLAGS']
-
-            cflags = map(lambda flag: re.sub(self.IFLAG_RE, '-idirafter', flag, 1), cflags)
-            flags.update(cflags)
-
-        dirparts = list(self.dirname.parts)
-        try:
-            src_index = dirparts.index('src')
-            dirparts[src_index] = 'include'
-            flags.add("-I"+str(Path(*dirparts)))
-        except ValueError:
-            pass
-
-        if self.type == SourceType.C:
-            flags.add("-xc")
-
-        return flags
+        return compiler_extra_args_for(self.dirname, self.type)
 
     def compiler_cmd_clang(self):
-        extra_args1 = self.compiler_extra_args()
-        header_units = []
+        head, tail = clang_argv_parts(self.type)
 
         if self.type == SourceType.USER_HEADER:
-            return [C, "-xc++-header", "-fmodule-header=user", f"-fprebuilt-module-path={OBJDIR}", *CCFLAGS, *CXXFLAGS, *INCPATH, "-o"+self.cmpath, "-c", self.path]
-        
+            return [*head, "-o"+str(self.cmpath), "-c", str(self.path)]
+
         elif self.type == SourceType.SYSTEM_HEADER:
             raise NotImplementedError
-        
+
         elif self.type == SourceType.MODULE:
-            extra_args2 = [f"-fmodule-file={f}" for f in header_units] + [
-                "-xc++-module", 
-                f"-fmodule-output={self.cmpath}", 
-                "-MD", 
-                f"-MF{self.makefile}"
-            ]
-            return [CXX, f"-fprebuilt-module-path={OBJDIR}", *extra_args1, *extra_args2, *CCFLAGS, *INCPATH, "-o"+str(self.objpath), "-c", self.path]
-        
+            return [*head, *self.compiler_extra_args(),
+                    "-xc++-module", f"-fmodule-output={self.cmpath}",
+                    "-MD", f"-MF{self.makefile}",
+                    *tail, "-o"+str(self.objpath), "-c", str(self.path)]
+
         else:
-            if self.type == SourceType.C:
-                cmd = CC
-                
-            extra_args2 = [f"-fmodule-file={f}" for f in header_units] + ["-MD", f"-MF{self.makefile}"]
-            return [CXX, f"-fprebuilt-module-path={OBJDIR}", *extra_args1, *extra_args2, *CCFLAGS, *CXXFLAGS, *INCPATH, "-o"+str(self.objpath), "-c", self.path]
+            return [*head, *self.compiler_extra_args(),
+                    "-MD", f"-MF{self.makefile}",
+                    *tail, "-o"+str(self.objpath), "-c", str(self.path)]
 
     def compiler_cmd_gcc(self):
-        cmd = CXX
-        if self.type == SourceType.C:
-            cmd = CC
-            
-        args = [cmd]
-        if self.type == SourceType.SYSTEM_HEADER:
-            args += ["-fmodules-ts", "-fmodule-header=system", "-I.", *CXXFLAGS]
-
-        elif self.type == SourceType.USER_HEADER:
-            args += ["-fmodules-ts", "-fmodule-header=user", "-iquote.", *CXXFLAGS]
+        args = list(gcc_argv_prefix(self.type))
 
-        elif self.type == SourceType.CPP:
-            args += [
-                "-fmodules-ts", 
-                *CXXFLAGS
-            ]
-
-        elif self.type == SourceType.C:
+        if self.type == SourceType.C:
             args += ["-MD", f"-MF{self.makefile}"]
 
         args += [*self.compiler_extra_args(), *CCFLAGS, *INCPATH]
@@ -435,7 +792,6 @@ class SourceFile:
         else:
             self.compile_gcc(target)
 
-    MODULE_MAPPER_LINE_RE = re.compile(r'^([A-Z-]+)\b(.*)')
     def compile_gcc(self, target):
         if self.type == SourceType.C:
             self.compile_gcc_c(target)
@@ -449,7 +805,9 @@ class SourceFile:
         mapper_read, compiler_write = os.pipe()
         compiler_read, mapper_write = os.pipe()
 
-        cmd = self.compiler_cmd() + [f"-fmodule-mapper=<{compiler_read}>{compiler_write}"]
+        # mapper fds are dup2'ed to fixed numbers in the child, so the
+        # command line does not depend on whatever os.pipe handed out
+        cmd = self.compiler_cmd() + ["-fmodule-mapper=<3>4"]
 
         cmdline = " ".join(shlex.quote(item) for item in cmd)
         print(cmdline)
@@ -457,145 +815,173 @@ class SourceFile:
         env = dict(os.environ)
         env['SOURCE_DATE_EPOCH'] = '0'
 
-        process = subprocess.Popen(
-            cmd,
-            env=env,
-            pass_fds=(compiler_read, compiler_write),
-            stdin=0, stdout=1, stderr=2)
-        
-        #pid = os.spawn({ 'SOURCE_DATE_EPOCH': '0' }, cmdline, {3: compiler_read, 4: compiler_write})
+        # posix_spawn avoids fork's page-table copy of the (large) driver
+        pid = os.posix_spawnp(cmd[0], cmd, env, file_actions=[
+            (os.POSIX_SPAWN_DUP2, compiler_read, 3),
+            (os.POSIX_SPAWN_DUP2, compiler_write, 4),
+        ])
+        process = SpawnedProcess(pid)
 
         os.close(compiler_read)
         os.close(compiler_write)
-        mapper_read = os.fdopen(mapper_read, 'r')
-        mapper_write = os.fdopen(mapper_write, 'w')
+        reader = PipeReader(mapper_read, process)
 
         self.deps = set()
         self.vcpkgs = set()
 
-        try:
-            eof = False
-            while not eof:
-                lines = []
-                while True:
-                    line = mapper_read.readline()
-                    if line == "":
-                        eof = True
-                        break;
-                    
-                    line = line.strip()
-                    # debug_log("GOT LINE <%s>" % line)
-
-                    m = re.match(self.MODULE_MAPPER_LINE_RE, line)
-                    cmd, args = m.groups()
-                    args = args.strip().split()
-                    # debug_log("ARGS", args)
-                    lines.append((cmd, args))
-                    
-                    if len(args) == 0 or args[-1] != ';':
-                        break
-
-                out = []
-
-                for line in lines:
-                    cmd, args = line
-                    # debug_log("CMD", cmd, args)
-
-                    if cmd == "HELLO":
-                        out.append("HELLO 1 compile.rb")
-                        
-                    elif cmd == "INCLUDE-TRANSLATE":
-                        file = args[0]
-                        if not file.startswith('/'):
-                            path = Path(file)
-                            #debug_log(f"INCLUDE-TRANSLATE {path}")
-                            header_dep = HeaderDep.get(path)
-
-                            self.deps.add(header_dep)
-                            self.header_deps.add(header_dep)
-
-                        out.append("BOOL TRUE")
-
-                    elif cmd == "MODULE-REPO":
-                        out.append("PATHNAME obj/release")
-
-                    elif cmd == "MODULE-IMPORT":
-                        debug_log("MODULE-IMPORT #{path}: #{args}")
-
-                        modname = args[0].replace("'", '')
-                        mod = CompiledModule.get(modname)
-                        cmhash = mod.build(target)
-                        self.deps.add(ModuleDep(modname, cmhash))
-
-                    elif cmd == "MODULE-EXPORT":
-                        modname = args[0]
-                        debug_log(f"MODULE-EXPORT {modname}")
-                        file = modname.replace("'", '').replace(':', '-')
-                        if file.startswith('/'):
-                            file = "system" + file + ".pcm"
-                        elif file.startswith("./"):
-                            file = file[2:] + ".pcm"
-                        else:
-                            file = file.replace('.', '/') + ".pcm"
-                        out.append(f"PATHNAME {file}")
-
-                    elif cmd == "MODULE-COMPILED":
-                        out.append("OK")
-
-                    else:
-                        warn(f"unknown command: {cmd}")
-
-                if len(out) == 0:
+        eof = False
+        while not eof:
+            lines = []
+            while True:
+                line = reader.readline()
+                if line == b"":
+                    eof = True
+                    break
+
+                # protocol lines are "COMMAND arg arg [;]"
+                cmd, _, rest = line.strip().partition(b' ')
+                args = rest.split()
+                lines.append((cmd, args))
+
+                if len(args) == 0 or args[-1] != b';':
+                    break
+
+            out = []
+
+            for cmd, args in lines:
+                handler = self.MAPPER_COMMANDS.get(cmd)
+                if handler is None:
+                    warn(f"unknown command: {cmd.decode()}")
                     continue
+                handler(self, args, target, out)
 
-                s = " ;\n".join(out) + '\n'
-                # debug_log("WRITING <%s>" % s)
-                mapper_write.write(s)
-                mapper_write.flush()
+            if len(out) == 0:
+                continue
 
-        except EOFError as ex:
-            debug_log("got exception", ex)
-            pass
+            # one write per batch, no intermediate flushing
+            os.write(mapper_write, (" ;\n".join(out) + '\n').encode())
+
+        reader.close()
+        os.close(mapper_write)
 
-        mapper_read.close()
-        mapper_write.close()
-        
         exitcode = process.wait()
         if exitcode != 0:
             exit(exitcode)
 
+    def mapper_hello(self, args, target, out):
+        out.append("HELLO 1 compile.rb")
+
+    def mapper_include_translate(self, args, target, out):
+        file = args[0].decode()
+        if not file.startswith('/'):
+            path = Path(file)
+            header_dep = HeaderDep.get(path)
+
+            self.deps.add(header_dep)
+            self.header_deps.add(header_dep)
+
+        out.append("BOOL TRUE")
+
+    def mapper_module_repo(self, args, target, out):
+        out.append("PATHNAME obj/release")
+
+    def mapper_module_import(self, args, target, out):
+        debug_log("MODULE-IMPORT #{path}: #{args}")
+
+        modname = args[0].decode().replace("'", '')
+        mod = CompiledModule.get(modname)
+        cmhash = mod.build(target)
+        self.deps.add(ModuleDep(modname, cmhash))
+
+    def mapper_module_export(self, args, target, out):
+        modname = args[0].decode()
+        debug_log(f"MODULE-EXPORT {modname}")
+        file = modname.replace("'", '').replace(':', '-')
+        if file.startswith('/'):
+            file = "system" + file + ".pcm"
+        elif file.startswith("./"):
+            file = file[2:] + ".pcm"
+        else:
+            file = file.replace('.', '/') + ".pcm"
+        out.append(f"PATHNAME {file}")
+
+    def mapper_module_compiled(self, args, target, out):
+        out.append("OK")
+
+    MAPPER_COMMANDS = {
+        b"HELLO":             mapper_hello,
+        b"INCLUDE-TRANSLATE": mapper_include_translate,
+        b"MODULE-REPO":       mapper_module_repo,
+        b"MODULE-IMPORT":     mapper_module_import,
+        b"MODULE-EXPORT":     mapper_module_export,
+        b"MODULE-COMPILED":   mapper_module_compiled,
+    }
+
     def compile_gcc_c(self, target):
         print(f"BUILDING {self.type} {self.path}")
-        
-        shell(*self.compiler_cmd())
+
+        key = self.object_cache_key()
+        if key and self.makefile.exists() and object_cache_fetch(key, self.objpath):
+            print(f"object cache hit: {self.path}")
+            self.process_makefile_deps()
+            return
+
+        shell_run(*self.compiler_cmd())
         self.process_makefile_deps()
+        object_cache_store(self.object_cache_key(self.serialize_deps()), self.objpath)
 
     def compile_clang(self, target):
         deps, header_units = self.clang_get_deps(target)
-        
+
         print(f"COMPILE {self.path}: ")
-        
+
+        key = self.object_cache_key()
+        if key and self.makefile.exists() and object_cache_fetch(key, self.objpath):
+            print(f"object cache hit: {self.path}")
+            self.process_makefile_deps()
+            return deps
+
         subprocess.run(self.compiler_cmd(), check=True)
         self.process_makefile_deps()
+        object_cache_store(self.object_cache_key(self.serialize_deps()), self.objpath)
         return deps
 
     def clang_get_deps(self, target):
         self.deps = set()
         self.vcpkgs = set()
 
+        # prefer the rule from the single batch scan over a private fork
+        rule = batch_scan_deps().get(os.path.normpath(str(self.objpath)))
+        if rule is not None:
+            self.process_p1689_rule(rule, target)
+            return self.deps, []
+
+        rule, header_units = self.scan_deps_single(target)
+        self.process_p1689_rule(rule, target)
+        return self.deps, header_units
+
+    def scan_deps_single(self, target):
         if self.type in [SourceType.USER_HEADER, SourceType.SYSTEM_HEADER]:
             extra_args = ["-xc++-header"]
         else:
             extra_args = ["-xc++"]
+
+        # header units found by earlier scans apply to later TUs too:
+        # preloading them avoids the failed-scan-then-retry round trip
+        header_units = sorted(SourceFile.known_header_units)
+        extra_args += [f"-fmodule-file={f}" for f in header_units]
+
         args = ["clang-scan-deps", "-format=p1689", "--", CXX, *extra_args, f"-fprebuilt-module-path={OBJDIR}", *CCFLAGS, *INCPATH, "-o"+self.objpath, "-c", self.path]
 
-        stdout, stderr, status = subprocess.run(args, capture_output=True)
+        # subprocess.run returns a CompletedProcess; the old tuple unpack
+        # iterated its attributes and crashed on any scan
+        result = subprocess.run(args, capture_output=True)
 
-        header_units = []
-        #line_match = re.compile('^[a-zA-Z0-9\-_.\/]+:\d+:\d+: error: header file (["<])([a-zA-Z0-9\-_.\/]+)[">] \(aka \'([a-zA-Z0-9\-_.\/]+)\'\) cannot be imported because it is not known to be a header unit\n$')
-        if status.returncode != 0:
+        if result.returncode != 0:
+            new_units = []
+            stderr = result.stderr
             for line in stderr.decode().splitlines():
-                m = re.match(r'^.*:\d+:\d+: error: header file (["<])([a-zA-Z0-9\-_.\/]+)[">] \(aka \'([a-zA-Z0-9\-_.\/]+)\'\) cannot be imported because it is not known to be a header unit\n$', line)
+                m = CLANG_HEADERUNIT_PAT.match(line)
                 if m:
                     type = 'system_header' if m.group(1) == '<' else 'user_header'
                     header_path = m.group(3)
@@ -604,21 +990,26 @@ class SourceFile:
                     if type == 'user_header':
                         self.deps.add(srcfile)
                     self.vcpkgs.update(srcfile.vcpkgs)
-                    header_units.append(srcfile.cmpath)
+                    new_units.append(srcfile.cmpath)
+                    SourceFile.known_header_units.add(srcfile.cmpath)
 
-            extra_args += [f"-fmodule-file={f}" for f in header_units]
+            header_units += new_units
+            extra_args += [f"-fmodule-file={f}" for f in new_units]
             args = ["clang-scan-deps", "-format=p1689", "--", CXX, *extra_args, f"-fprebuilt-module-path={OBJDIR}", *CCFLAGS, *INCPATH, "-o"+self.objpath, "-c", self.path]
-            stdout, stderr, status = subprocess.run(args, capture_output=True)
+            result = subprocess.run(args, capture_output=True)
 
-            if status.returncode != 0:
+            if result.returncode != 0:
                 warn("SCANDEPS failed")
-                warn(stderr.decode())
+                warn(result.stderr.decode())
                 exit(1)
 
-        p1689 = json.loads(stdout.decode())
-        provides = p1689["rules"][0]["requires"]
+        # the decoder takes the stdout bytes directly; no decode pass
+        p1689 = json_loads(result.stdout)
+        return p1689["rules"][0], header_units
+
+    def process_p1689_rule(self, rule, target):
         if self.type == 'module':
-            provides = p1689["rules"][0]["provides"]
+            provides = rule.get("provides")
             if not provides or len(provides) != 1:
                 warn(f"wanted module with name {self.modname} in file {self.path} but got something else")
                 exit(1)
@@ -628,7 +1019,7 @@ class SourceFile:
                 warn(f"wanted module with name {self.modname} in file {self.path} but got {name}")
                 exit(1)
 
-        reqs = p1689["rules"][0]["requires"]
+        reqs = rule.get("requires")
         if reqs:
             for req in reqs:
                 modname = req["logical-name"]
@@ -636,37 +1027,175 @@ class SourceFile:
                 mod = CompiledModule.get(modname)
                 mod.build(target)
                 self.deps.add(mod)
-        return self.deps, header_units
 
     def process_makefile_deps(self):
         if self.type in [SourceType.USER_HEADER, SourceType.SYSTEM_HEADER]:
             return
-        text = self.makefile.read_text()
-        rules = parse_makefile_rules(text)
+        rules = parse_makefile_rules(self.makefile.read_bytes())
         for rule in rules:
             if not rule.startswith('/') and rule != self.path:
                 headerdep = HeaderDep.get(Path(rule))
                 self.deps.add(headerdep)
                 self.header_deps.add(headerdep)
-                
-            elif re.match(VCPKG_INCLUDE_RE, rule):
-                pkg = re.match(VCPKG_INCLUDE_RE, rule).group(1)
-                self.vcpkgs.add(pkg)
-
 
+            else:
+                m = VCPKG_INCLUDE_PAT.match(rule)
+                if m:
+                    self.vcpkgs.add(m.group(1))
+
+
+class SpawnedProcess:
+    # minimal Popen-alike over a raw posix_spawn pid
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid != 0:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+
+class PipeReader:
+    # buffered line reader over a raw fd: one os.read per 64K instead of
+    # one syscall per protocol line
+    def __init__(self, fd, process=None):
+        self.fd = fd
+        self.process = process
+        self.buf = bytearray()
+        self.eof = False
+        self.sel = selectors.DefaultSelector()
+        self.sel.register(fd, selectors.EVENT_READ)
+
+    def fill(self):
+        # wait through a selector so a compiler that dies without closing
+        # its end of the pipe cannot wedge the build
+        while True:
+            ready = self.sel.select(timeout=0.1 if self.process else None)
+            if ready:
+                chunk = os.read(self.fd, 65536)
+                if not chunk:
+                    self.eof = True
+                else:
+                    self.buf += chunk
+                return
+            if self.process is not None and self.process.poll() is not None:
+                self.eof = True
+                return
+
+    def readline(self) -> bytes:
+        while True:
+            i = self.buf.find(b'\n')
+            if i >= 0:
+                line = bytes(self.buf[:i])
+                del self.buf[:i + 1]
+                return line
+            if self.eof:
+                line = bytes(self.buf)
+                self.buf.clear()
+                return line
+            self.fill()
+
+    def close(self):
+        self.sel.close()
+        os.close(self.fd)
+
+
+# one clang-scan-deps pass over every TU instead of one fork per file;
+# files discovered mid-build fall back to scan_deps_single
+_scan_deps_rules = None
+
+# dedicated lock: the database build below fans out to pool workers
+# whose SourceFile.get/get_dircfg calls take _REGISTRY_LOCK, so holding
+# that here would deadlock the fan-out
+_SCAN_DEPS_LOCK = threading.Lock()
+
+def batch_scan_deps():
+    global _scan_deps_rules
+    with _SCAN_DEPS_LOCK:
+        if _scan_deps_rules is not None:
+            return _scan_deps_rules
+        rules = {}
+
+        dbfile = OBJDIR / "scan_deps_db.json"
+        os.makedirs(OBJDIR, exist_ok=True)
+        CompilationDatabase([SRCDIR]).write(dbfile)
+
+        result = subprocess.run(
+            ["clang-scan-deps", f"-compilation-database={dbfile}",
+             "-format=p1689", f"-j{os.cpu_count()}"],
+            capture_output=True)
+        if result.returncode != 0:
+            warn("batch clang-scan-deps failed, falling back to per-file scans")
+            warn(result.stderr.decode())
+            _scan_deps_rules = rules
+            return rules
+
+        p1689 = json_loads(result.stdout)
+        for rule in p1689.get("rules", []):
+            output = rule.get("primary-output")
+            if output:
+                rules[os.path.normpath(output)] = rule
+        _scan_deps_rules = rules
+        return rules
+
+
+@dataclass(frozen=True, slots=True)
 class ModuleDep:
-    def __init__(self, name, sha256):
+    name: str
+    digest: str
+
+class CompiledModule:
+    __slots__ = ('name', 'cmhash', 'lock')
+
+    modules: Dict[str, 'CompiledModule'] = {}
+
+    @staticmethod
+    def get(name: str) -> 'CompiledModule':
+        mod = CompiledModule.modules.get(name)
+        if mod is None:
+            mod = CompiledModule(name)
+            CompiledModule.modules[name] = mod
+        return mod
+
+    def __init__(self, name: str):
         self.name = name
-        self.sha256 = sha256
+        self.cmhash = None
+        self.lock = threading.Lock()
+
+    def build(self, target) -> str:
+        with self.lock:
+            if self.cmhash is None:
+                srcpath = self.find_source()
+                file = target.compile(srcpath, modname=self.name)
+                # another thread may have claimed the actual build
+                file.done.wait()
+                self.cmhash = fast_hash_file(file.cmpath)
+            return self.cmhash
+
+    def find_source(self) -> Path:
+        if self.name.startswith('./'):
+            stem = self.name[2:]
+        else:
+            stem = self.name.replace(':', '-').replace('.', '/')
 
-class DirectoryConfig:
-    @classmethod
-    @cache
-    def get(cls, path: Path):
-        cfg = DirectoryConfig(path)
-        cfg.process()
-        return cfg
+        for ext in CCFILE_SUFFIXES:
+            path = Path(SRCDIR, stem + ext)
+            if path.exists():
+                return path
+
+        warn(f"cannot find source for module {self.name}")
+        exit(1)
 
+class DirectoryConfig:
     def __init__(self, path: Path):
         self.dir = path.relative_to(SRCDIR)
 
@@ -678,10 +1207,23 @@ class DirectoryConfig:
             return
         
         json_file = DEPDIR / self.dir / 'buildvars.json'
+        hash_file = DEPDIR / self.dir / 'buildvars.hash'
         json_mtime = json_file.mtime()
         buildrb_mtime = buildrb_file.mtime()
 
         if buildrb_mtime > json_mtime or THIS_MTIME > json_mtime:
+            # a newer mtime is often just a touch (checkout, rebase): if
+            # the BUILD.py bytes still hash the same, skip the exec and
+            # the pkg-config queries, and bump the json mtime so future
+            # runs take the cheap branch without even hashing
+            srchash = fast_hash_file(buildrb_file)
+            if json_mtime and try_read(hash_file) == srchash:
+                self.load_buildvars(json_file)
+                os.utime(json_file)
+                stat_cache_invalidate(json_file)
+                self.set_linkflags()
+                return
+
             text = try_read(buildrb_file)
             code = compile(text, buildrb_file, 'exec')
             env = {}
@@ -697,16 +1239,27 @@ class DirectoryConfig:
 
             self.handle_pkgconfig(self.buildvars)
             os.makedirs(json_file.parent, exist_ok=True)
-            with open(json_file, 'w') as f:
-                json.dump(self.buildvars, f, indent=2)
+            if orjson is not None:
+                with open(json_file, 'wb') as f:
+                    f.write(orjson.dumps(self.buildvars, option=orjson.OPT_INDENT_2))
+            else:
+                with open(json_file, 'w') as f:
+                    json.dump(self.buildvars, f, indent=2)
+            stat_cache_invalidate(json_file)
+            atomic_write(hash_file, srchash, durable=False)
         else:
-            try:
-                with open(json_file, 'r') as f:
-                    self.buildvars = json.load(f)
-            except Exception as ex:
-                warn("error reading JSON %s: %s" % (json_file, str(ex)))
-                exit(1)
+            self.load_buildvars(json_file)
 
+        self.set_linkflags()
+
+    def load_buildvars(self, json_file):
+        try:
+            self.buildvars = json_loads(try_read(json_file, binary=True))
+        except Exception as ex:
+            warn("error reading JSON %s: %s" % (json_file, str(ex)))
+            exit(1)
+
+    def set_linkflags(self):
         if 'LINKFLAGS' in self.buildvars:
             self.linkflags = self.buildvars['LINKFLAGS']
         else:
@@ -724,11 +1277,9 @@ class DirectoryConfig:
         if 'CFLAGS' in buildvars:
             cflags.update(buildvars['CFLAGS'])
         
-        for pkg in buildvars['PKGCONFIG']:
-            libs_flags = shlex.split(shell("pkg-config", "--libs", pkg))
-            cflags_cur = self.filter_cflags(shlex.split(shell("pkg-config", "--cflags", pkg)))
-            linkflags.update(libs_flags)
-            cflags.update(cflags_cur)
+        libs_flags, cflags_pkg = pkgconfig_flags(*buildvars['PKGCONFIG'])
+        linkflags.update(libs_flags)
+        cflags.update(self.filter_cflags(cflags_pkg))
 
         if linkflags:
             buildvars['LINKFLAGS'] = list(linkflags)
@@ -747,24 +1298,43 @@ class DirectoryConfig:
             
         return out
 
+# flat dict instead of @cache on a classmethod: one str-keyed lookup per
+# call, no descriptor binding, and the same directory repeats constantly
+_DIRCFG: Dict[str, DirectoryConfig] = {}
+
+def get_dircfg(path: Path) -> DirectoryConfig:
+    key = os.fspath(path)
+    cfg = _DIRCFG.get(key)
+    if cfg is None:
+        with _REGISTRY_LOCK:
+            cfg = _DIRCFG.get(key)
+            if cfg is None:
+                cfg = DirectoryConfig(path if isinstance(path, Path) else Path(path))
+                cfg.process()
+                _DIRCFG[key] = cfg
+    return cfg
+
+
+@dataclass(eq=False, slots=True)
 class HeaderDep:
-    files = {}
+    path: Path
+    built: bool = False
+    cpp_path: Path = None
+
+    files: ClassVar[Dict[str, 'HeaderDep']] = {}
 
     @classmethod
-    @cache
     def get(cls, path: Path):
-        #path = str(Path(path).resolve())
-        #file = cls.files.get(path)
-        #if file:
-        #    return file
-        #debug_log("HeaderDep", path)
-        return HeaderDep(path)
-        #cls.files[path] = file
-        #return file
-
-    def __init__(self, path):
-        self.path = path
-        self.built = False
+        key = os.fspath(path)
+        if not isinstance(path, Path):
+            key = os.path.normpath(key)
+        file = cls.files.get(key)
+        if file is None:
+            with _REGISTRY_LOCK:
+                file = cls.files.get(key)
+                if file is None:
+                    file = cls.files[key] = HeaderDep(path)
+        return file
 
     def build(self, target):
         if self.built:
@@ -773,40 +1343,90 @@ class HeaderDep:
         #debug_log("HeaderDep.build", self.path)
         
         dirname = self.path.parent
-        dircfg = DirectoryConfig.get(dirname)
+        dircfg = get_dircfg(dirname)
 
         target.add_config(dircfg)
-        cppfile = self.find_cpp(self.path)
+        cppfile = self.resolve_cpp()
         debug_log('find_cpp', self.path, '-->', cppfile)
         if cppfile:
             self.cpp_path = cppfile
             target.compile(self.cpp_path)
             return
 
+    def probe_dirs(self):
+        # the directories find_cpp consults: the header's own, plus the
+        # include->src remap when it applies
+        dirs = [os.path.dirname(str(self.path))]
+        parts = self.path.parts
+        if 'include' in parts:
+            parts = list(parts)
+            parts[parts.index('include')] = 'src'
+            dirs.append(os.path.dirname(str(Path(*parts))))
+        return dirs
+
+    def resolve_cpp(self):
+        # the answer depends on what exists next to the header, not on
+        # the header's bytes: key the persisted record on the candidate
+        # directories' mtimes so creating or deleting a sibling cpp
+        # invalidates it on the next run
+        dirs = self.probe_dirs()
+        dirmtimes = [Path(dir).mtime() for dir in dirs]
+        cache = HDEP_CACHE.load()
+        key = str(self.path)
+        record = cache.get(key)
+        if (record is not None and record.get('dirs') == dirs
+                and record.get('dirmtimes') == dirmtimes):
+            return Path(record['cpp']) if record['cpp'] else None
+
+        cppfile = find_cpp(self.path)
+        cache[key] = {
+            'dirs': dirs,
+            'dirmtimes': dirmtimes,
+            'cpp': str(cppfile) if cppfile else None,
+        }
+        HDEP_CACHE.dirty = True
+        return cppfile
+
     @cache
     def mtime(self):
-        return self.path.mtime()
-
-    def find_cpp(self, hfile: Path):
-        if hfile.suffix not in HFILE_SUFFIXES:
-            return
-        
-        basename = hfile.with_suffix('')
-        for ext in [".cc", ".cpp", ".c"]:
-            cppfile = basename.with_extra_suffix(ext)
-            if cppfile.exists():
-                return cppfile
-            
-        #print("!!!!", list(hfile.parts), 'include' in hfile.parts)
-        if "include" in hfile.parts:
-            parts = list(hfile.parts)
-            parts[parts.index('include')] = 'src'
-            newpath = Path(*parts)
-            return self.find_cpp(newpath)
-        
+        # only the mtime is wanted here, so on a shared-cache miss use
+        # the statx fast path instead of prescanning the directory
+        st = _STAT_CACHE.get(str(self.path), _MISSING)
+        if st is not _MISSING:
+            return st.st_mtime_ns if st is not None else 0
+        return _fast_mtime(str(self.path))
+
+
+# module-level and @cache'd so misses (the common case) are remembered
+# too: the include->src remap keeps landing on the same None results,
+# and the recursive call goes back through the cache
+@cache
+def find_cpp(hfile: Path):
+    # rpartition is cheaper than pathlib's suffix parsing, and the
+    # frozenset test is a single hashed probe
+    suffix = '.' + hfile.name.rpartition('.')[2]
+    if suffix not in HFILE_SUFFIXES:
         return None
-    
-      
+
+    # most probes miss, so check against the cached directory listing
+    # instead of stat()ing each candidate individually
+    basename = hfile.with_suffix('')
+    listing = _dir_listing(os.fspath(hfile.parent))
+    for ext in (".cc", ".cpp", ".c"):
+        if basename.name + ext in listing:
+            return basename.with_extra_suffix(ext)
+
+    #print("!!!!", list(hfile.parts), 'include' in hfile.parts)
+    if "include" in hfile.parts:
+        parts = list(hfile.parts)
+        parts[parts.index('include')] = 'src'
+        newpath = Path(*parts)
+        return find_cpp(newpath)
+
+    return None
+
+
+
 # def setup_vscode(path):
 #     os.makedirs(os.path.join(path, '.vscode'), exist_ok=True)
 #     name = os.path.basename(path)
@@ -832,30 +1452,61 @@ class CompilationDatabase:
         self.paths = paths
         self.processed_files = set()
         self.entries = []
+        self.lock = threading.Lock()
 
     def build(self):
-        for path in find_files(self.paths, suffixes=[".cc", ".cpp", ".c"]):
-            self.process_file(path)
-
-        return json.dumps(self.entries, indent=2)
+        # compiler_cmd_clang stats and reads per-directory config, so the
+        # per-file work is IO bound; fan it out like the compile path does
+        parallel_each(self.process_file,
+                      list(find_files(self.paths, suffixes=[".cc", ".cpp", ".c"])))
+        self.entries.sort(key=lambda entry: entry[0])
+        return self.entries
+
+    def write(self, path: Path):
+        # stream straight into the temp file so the serialized JSON never
+        # exists as one big string alongside the entries list; the dicts
+        # only exist here, transiently
+        self.build()
+        cwd = os.getcwd()
+        entries = [{
+            "file": file,
+            "directory": cwd,
+            "arguments": list(arguments),
+        } for file, arguments in self.entries]
+        tmpfile = path.with_extra_suffix(".tmp")
+        if orjson is not None:
+            # ~10x faster to serialize, and IDEs re-read this constantly
+            with open(tmpfile, 'wb') as f:
+                f.write(orjson.dumps(entries, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmpfile, 'w') as f:
+                json.dump(entries, f, indent=2)
+        # same no-op elision as atomic_write, but chunked: skip the rename
+        # (and the mtime bump) when the database is unchanged
+        if path.exists() and filecmp.cmp(tmpfile, path, shallow=False):
+            os.unlink(tmpfile)
+            return
+        os.rename(tmpfile, path)
+        stat_cache_invalidate(path)
 
     def process_file(self, path):
         # path = os.path.normpath(os.path.join(basepath, filepath))
         file = SourceFile.get(path)
-        if file in self.processed_files:
-            return
-        
-        self.processed_files.add(file)
+        with self.lock:
+            if file in self.processed_files:
+                return
+            self.processed_files.add(file)
 
         # dirpath = os.path.dirname(filepath)
         # filename = os.path.basename(filepath)
-        compilation_cmd = [str(cmd) for cmd in file.compiler_cmd_clang()]
+        # sys.intern collapses the flag strings repeated across every TU
+        # (-I, -std=..., warning flags) to one object each; the JSON dicts
+        # are only materialized at write() time. compiler_cmd_clang emits
+        # plain strings, so map() skips a per-token str() round-trip
+        compilation_cmd = tuple(map(sys.intern, file.compiler_cmd_clang()))
 
-        self.entries.append({
-            "file": str(path),
-            "directory": os.getcwd(),
-            "arguments": compilation_cmd,
-        })
+        with self.lock:
+            self.entries.append((str(path), compilation_cmd))
 
 def find_files(paths: Path, suffixes: tuple[str], prefixes: tuple[str] = None):
     """
@@ -873,98 +1524,408 @@ def find_files(paths: Path, suffixes: tuple[str], prefixes: tuple[str] = None):
     # print("file", paths)
     suffixes = tuple(suffixes)  # Convert to tuple for faster checks
 
-    for directory in paths:
-        with os.scandir(directory) as entries:
-            for entry in entries:
-                # print("entry", entry)
-                if entry.is_file() and entry.name.endswith(suffixes):
-                    if prefixes is not None and not entry.name.startswith(prefixes):
-                        continue
+    # iterative traversal: no generator frame per directory, and
+    # is_dir(follow_symlinks=False) reads the d_type the scandir already
+    # returned instead of stat()ing symlink candidates separately
+    stack = collections.deque(paths)
+    while stack:
+        with os.scandir(stack.popleft()) as it:
+            # d_ino order roughly follows on-disk layout, so the opens
+            # that follow (hashing, scanning) get sequential readahead
+            # on a cold cache; inode() is free, it comes from readdir
+            entries = sorted(it, key=lambda entry: entry.inode())
+        for entry in entries:
+            # print("entry", entry)
+            if entry.is_file() and entry.name.endswith(suffixes):
+                if prefixes is not None and not entry.name.startswith(prefixes):
+                    continue
 
-                    yield Path(entry.path)
-                    
-                elif entry.is_dir() and not entry.is_symlink() and not entry.name.startswith("."):  # Recurse into subdirectories
-                    yield from find_files([entry.path], suffixes=suffixes, prefixes=prefixes)
+                # the DirEntry stat is already paid for; seed the shared
+                # cache so mtime()/exists() on the yielded Path are dict hits
+                try:
+                    _STAT_CACHE.setdefault(os.path.normpath(entry.path), entry.stat())
+                except OSError:
+                    pass
+                yield Path(entry.path)
+
+            elif entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+                stack.append(entry.path)
+
+# every JsonCache ever constructed, so flush_caches can reach them all
+_JSON_CACHES: list['JsonCache'] = []
+
+def flush_caches():
+    # atexit does not run across os.execv, so the run/test commands must
+    # flush the dirty caches themselves before replacing the process
+    for cache in _JSON_CACHES:
+        cache.save()
+
+class JsonCache:
+    # lazily loaded JSON map under OBJDIR, flushed at exit when dirty
+    def __init__(self, name: str):
+        self.name = name
+        self.data = None
+        self.dirty = False
+        _JSON_CACHES.append(self)
+
+    def load(self):
+        if self.data is not None:
+            return self.data
+
+        with _REGISTRY_LOCK:
+            if self.data is not None:
+                return self.data
+
+            data = {}
+            text = try_read(OBJDIR / self.name)
+            if text:
+                try:
+                    data = json_loads(text)
+                except ValueError as ex:
+                    warn("ignoring corrupt %s: %s" % (self.name, str(ex)))
+
+            atexit.register(self.save)
+            self.data = data
+        return self.data
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(OBJDIR, exist_ok=True)
+        # sort_keys so structurally identical content always byte-matches
+        # and atomic_write can elide the rewrite
+        if orjson is not None:
+            data = orjson.dumps(self.data, option=orjson.OPT_INDENT_2
+                                | orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+        else:
+            data = json.dumps(self.data, indent=2, sort_keys=True) + '\n'
+        atomic_write(OBJDIR / self.name, data)
+        self.dirty = False
+
+HASH_CACHE = JsonCache("hashcache.json")
+PKGCONFIG_CACHE = JsonCache("pkgconfig.cache.json")
+
+# per-TU build records, replacing one .info file (open+read+parse) per TU
+INFO_MANIFEST = JsonCache("info.json")
+
+# header -> sibling-cpp resolutions, keyed on the candidate directories
+# and their mtimes (adding or removing a sibling bumps the dir mtime)
+HDEP_CACHE = JsonCache("hdepcache.json")
+
+# linked binary -> flat input list, for the noop fast path in build()
+TARGET_MANIFEST = JsonCache("targets.json")
+
+# pkg-config output is stable enough to reuse across builds for a day
+PKGCONFIG_CACHE_TTL = 24 * 3600
+
+def pkgconfig_flags(*pkgs: str):
+    # pkg-config exits nonzero when given no package names, and there is
+    # nothing to ask it anyway
+    if not pkgs:
+        return [], []
+
+    # pkg-config accepts the whole package list and merges the flags
+    # itself, so a directory costs two execs however many packages it
+    # names; the cache key is the list, which repeats across BUILD.py
+    # files and across runs
+    key = ' '.join(pkgs)
+    cache = PKGCONFIG_CACHE.load()
+    entry = cache.get(key)
+    now = time.time()
+    if entry and now - entry['time'] < PKGCONFIG_CACHE_TTL:
+        return entry['libs'], entry['cflags']
+
+    libs = shlex.split(shell_capture("pkg-config", "--libs", *pkgs))
+    cflags = shlex.split(shell_capture("pkg-config", "--cflags", *pkgs))
+    cache[key] = {'time': now, 'libs': libs, 'cflags': cflags}
+    PKGCONFIG_CACHE.dirty = True
+    return libs, cflags
+
+def argv_fingerprint(argv) -> str:
+    data = '\0'.join(str(arg) for arg in argv).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def fast_hash_file(path: Path) -> str:
+    st = os.stat(path)
+    cache = HASH_CACHE.load()
+    key = str(path)
+    entry = cache.get(key)
+    if entry and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+        return entry['hash']
+
+    # fingerprinting only, no adversary: prefer xxh3 when available,
+    # otherwise a short blake2b
+    if xxhash is not None:
+        h = xxhash.xxh3_128()
+    else:
+        h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        if st.st_size >= MMAP_HASH_THRESHOLD:
+            # one update over the mapping; the hash C code releases the GIL
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # tell the kernel the single pass is sequential so
+                # readahead stays ahead of the hash kernel on cold files
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+                h.update(mm)
+        else:
+            h.update(f.read())
+    digest = h.hexdigest()
+
+    cache[key] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'hash': digest}
+    HASH_CACHE.dirty = True
+    return digest
+
+def object_cache_path(key: str) -> Path:
+    return Path(os.fspath(OBJDIR), 'objcache', key[:2], key + '.o')
 
-def atomic_write(path: Path, data: str):
+def object_cache_fetch(key: str, objpath: Path) -> bool:
+    # hardlink, not copy: a hit costs one link() and shares the blocks
+    src = object_cache_path(key)
+    if not src.exists():
+        return False
+    try:
+        os.unlink(objpath)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, objpath)
+    except OSError:
+        return False
+    stat_cache_invalidate(objpath)
+    return True
+
+def object_cache_store(key: str, objpath: Path):
+    if key is None:
+        return
+    dst = object_cache_path(key)
+    if dst.exists():
+        return
+    os.makedirs(dst.parent, exist_ok=True)
+    try:
+        os.link(objpath, dst)
+    except OSError:
+        # cross-device or raced with another store; the cache is advisory
+        pass
+    else:
+        stat_cache_invalidate(dst)
+
+def fast_hash_files(paths) -> dict:
+    # hash a batch on the shared pool: xxhash/hashlib release the GIL
+    # during update(), so cold-cache refreshes scale across cores
+    paths = list(paths)
+    if len(paths) <= 1 or threading.current_thread() is not threading.main_thread():
+        return {str(path): fast_hash_file(path) for path in paths}
+    return dict(zip((str(path) for path in paths),
+                    get_executor().map(fast_hash_file, paths)))
+
+def atomic_write(path: Path, data, durable: bool = True):
+    # identical content means the write, the rename and the mtime bump
+    # (which would ripple staleness to dependents) can all be skipped
+    binary = isinstance(data, bytes)
+    if try_read(path, binary=binary) == data:
+        return
     tmpfile = path.with_extra_suffix(".tmp")
-    with open(tmpfile, 'w') as f:
+    with open(tmpfile, 'wb' if binary else 'w') as f:
         f.write(data)
-    os.rename(tmpfile, path)
-
-def try_read(path: Path):
+        if durable:
+            # flush to stable storage before the rename, or a crash can
+            # leave a truncated file behind the new name and poison the
+            # next build
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmpfile, path)
+    if durable:
+        dirfd = os.open(os.path.dirname(path) or '.', os.O_DIRECTORY)
+        try:
+            os.fsync(dirfd)
+        finally:
+            os.close(dirfd)
+    stat_cache_invalidate(path)
+
+def try_read(path: Path, binary: bool = False):
+    # one open/fstat/pread instead of Python's buffered-IO stack (which
+    # adds an lseek and chunked reads); O_CLOEXEC keeps the fd from
+    # leaking into spawned compilers
     try:
-        with open(path, 'r') as f:
-            return f.read()
+        fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
     except FileNotFoundError:
         return None
+    try:
+        data = os.pread(fd, os.fstat(fd).st_size, 0)
+    finally:
+        os.close(fd)
+    return data if binary else data.decode()
     
-def shell(*args):
+def shell_run(*args):
+    # for callers that ignore the output: no pipe fds, no read loop, the
+    # child writes straight to our stdout/stderr
     cmd = " ".join(shlex.quote(str(arg)) for arg in args)
     print(cmd)
-    result = subprocess.run(args, shell=False, text=True, stdin=0, stdout=subprocess.PIPE, stderr=2)
-    if result.returncode != 0:
+    argv = [str(arg) for arg in args]
+    pid = os.posix_spawnp(argv[0], argv, os.environ)
+    if SpawnedProcess(pid).wait() != 0:
         exit(1)
-    return result.stdout
 
+def shell_capture(*args):
+    argv = [str(arg) for arg in args]
+    # metadata queries (pkg-config) are not build output: only pay the
+    # shlex quoting and the echo when debug logging is on
+    if DEBUG_LOG:
+        warn(" ".join(shlex.quote(arg) for arg in argv))
+    # posix_spawn avoids fork()'s page-table copy of the Python heap,
+    # same as the compile path; stdin/stderr are inherited as before
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(argv[0], argv, os.environ,
+                              file_actions=[(os.POSIX_SPAWN_DUP2, write_fd, 1)])
+    finally:
+        os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    if SpawnedProcess(pid).wait() != 0:
+        exit(1)
+    return b''.join(chunks).decode()
+
+@cache
 def mod2cm(modname):
+    # called from SourceFile.__init__ and the mapper import/export
+    # handlers with the same few names over and over
     if modname.startswith('/'):
         path = modname[1:]
     elif modname.startswith('./'):
-        path = modname[2:].removeprefix((SRCDIR + '/', ''))
+        path = modname[2:].removeprefix(os.fspath(SRCDIR) + '/')
     else:
         path = modname.replace(':', '-')
     return path + ".pcm"
 
-def parse_makefile_rules(text):
-    rules = text.replace(':', '').replace('\\\n', '').split()
-    return rules[1:]
+_DEP_TRANS = bytes.maketrans(b':\\', b'  ')
+
+def parse_makefile_rules(data: bytes):
+    # one translate pass maps ':' and line continuations to whitespace,
+    # then the C-level split tokenizes; [1:] drops the rule's own target
+    # and phony-rule targets (whose paths already appeared as deps)
+    # collapse in the ordered dedupe
+    seen = set()
+    rules = []
+    for token in data.translate(_DEP_TRANS).split()[1:]:
+        if token not in seen:
+            seen.add(token)
+            rules.append(token.decode())
+    return rules
 
 def warn(*s: str):
     print(*s, file=sys.stderr)
 
-def debug_log(*text):
-    if DEBUG_LOG:
-        warn(*text)
+def _debug_log_real(*text):
+    warn(*text)
+
+def _debug_log_noop(*text):
+    pass
+
+# bind the no-op once at import when logging is off: every call site
+# looks the name up as a global, so there is no per-call flag test to
+# pay when disabled
+debug_log = _debug_log_real if DEBUG_LOG else _debug_log_noop
+
+def enable_debug_log():
+    global DEBUG_LOG, debug_log
+    DEBUG_LOG = True
+    debug_log = _debug_log_real
+
+def noop_build(ofile: Path) -> bool:
+    # the fastest build is noticing nothing changed: one stat of the
+    # binary plus one per recorded input, no scanning, no dep graph
+    st = ofile.stat()
+    if st is None:
+        return False
+    inputs = TARGET_MANIFEST.load().get(str(ofile))
+    if inputs is None:
+        return False
+    ofile_mtime = st.st_mtime_ns
+    for name in inputs:
+        mtime = Path(name).mtime()
+        if mtime == 0 or mtime >= ofile_mtime:
+            return False
+    return True
 
 def build(path: Path, buildtype: str):
-    name = path.with_suffix('')
+    name = Path(strip_suffix(os.fspath(path)))
+
+    suffix = SUFFIX + ('.so' if buildtype == TargetType.LIBRARY else '')
+    ofile = BINDIR / (name.name + suffix)
+    if noop_build(ofile):
+        return ofile
+
     target = Target(name, buildtype)
     target.compile(path, SourceType.CPP)
-    
+
     os.makedirs(BINDIR, exist_ok=True)
 
     return target.link()
 
-def vscode(paths: list[Path]):
-    db = CompilationDatabase(paths)
-    return db.build()
+def vscode(paths: list[Path], outpath: Path):
+    # memoize the whole database on its inputs: one directory walk
+    # decides whether the per-TU flag construction and the JSON
+    # serialization need to run at all; BUILD.py is in the scan because
+    # it changes the emitted flags
+    h = hashlib.blake2b(digest_size=16)
+    for file in sorted(find_files(paths, suffixes=('.cc', '.cpp', '.c', 'BUILD.py')), key=str):
+        st = file.stat()
+        if st is None:
+            continue
+        h.update(b'%s\0%d\0%d\0' % (os.fspath(file).encode(), st.st_mtime_ns, st.st_size))
+    stamp = h.hexdigest()
+    stamp_path = OBJDIR / "ide.stamp"
+    if outpath.exists() and try_read(stamp_path) == stamp:
+        return
 
-def mkpath(path: str) -> Path:
-    return Path(os.path.relpath(os.path.abspath(path), os.path.abspath(ROOT)))
+    db = CompilationDatabase(paths)
+    db.write(outpath)
+    os.makedirs(OBJDIR, exist_ok=True)
+    # a lost or truncated stamp only costs one regeneration, so skip
+    # the fsyncs that durable writes pay
+    atomic_write(stamp_path, stamp, durable=False)
+
+def mkpath(path: str, cwd: str = None) -> Path:
+    # one getcwd per call (or zero when the caller passes it in) instead
+    # of one inside each of the two abspath calls
+    if cwd is None:
+        cwd = os.getcwd()
+    return Path(os.path.relpath(os.path.normpath(os.path.join(cwd, path)),
+                                os.path.normpath(os.path.join(cwd, ROOT))))
 
 def run_tests(dirs: list[str]):
-    dirs = [os.path.abspath(dir) for dir in dirs]
+    cwd = os.getcwd()
+    dirs = [os.path.normpath(os.path.join(cwd, dir)) for dir in dirs]
 
     # change directory to root
     oldwd = None
     if ROOT != ".":
-        oldwd = os.getcwd()
+        oldwd = cwd
         os.chdir(ROOT)
+        cwd = os.getcwd()
 
-    
-    testmain_path = mkpath(TESTMAIN)
-    testmain_name = testmain_path.with_suffix('')
+    testmain_path = mkpath(TESTMAIN, cwd)
+    testmain_name = Path(strip_suffix(os.fspath(testmain_path)))
     target = Target(testmain_name, TargetType.EXECUTABLE)
     target.compile(testmain_path, SourceType.CPP)
-    
-    for filename in find_files(dirs, suffixes = ('_test.cc', '_test.cpp')):
+
+    def build_test(filename):
         print("building %s..." % filename)
-        path = mkpath(filename)
+        path = mkpath(filename, cwd)
         target.compile(path, SourceType.CPP)
 
+    parallel_each(build_test, find_files(dirs, suffixes = ('_test.cc', '_test.cpp')))
+
     bin = target.link()
     bin = os.path.abspath(bin)
+    # flush while OBJDIR still resolves relative to ROOT
+    flush_caches()
     if oldwd:
         os.chdir(oldwd)
     os.execv(bin, [bin])
@@ -972,7 +1933,11 @@ def run_tests(dirs: list[str]):
 
 ## MAIN ##
 def main():
-    global OBJDIR, DEPDIR, SRCDIR, BINDIR
+    global OBJDIR, DEPDIR, CCFLAGS, LFLAGS, SUFFIX
+
+    # only the CLI needs argparse; importing it here keeps library
+    # imports of this module (and their cold start) free of it
+    import argparse
 
     buildcfg = Release
     parser = argparse.ArgumentParser(
@@ -981,25 +1946,46 @@ def main():
     )
     parser.add_argument('--debug-log', action='store_true', help='enable debug logging')
     subparsers = parser.add_subparsers(dest='cmd')
-    
-    build_parser = subparsers.add_parser('build', help='build the specified binary or library')
-    build_parser.add_argument('path', help="path/to/file.cc")
-    build_parser.add_argument('--release', '-r', action='store_const', dest='buildtype', const='release', help='build in release mode')
-    build_parser.add_argument('--debug', '-d', action='store_const', dest='buildtype', const='debug', help='build in debug mode')
-    build_parser.add_argument('--library', action='store_true', help='build in library mode')
-    build_parser.add_argument('args', nargs='*')
-
-    run_parser = subparsers.add_parser('run', help='run the specified binary')
-    run_parser.add_argument('path', help="path/to/file.cc")
-    run_parser.add_argument('--release', '-r', action='store_const', dest='buildtype', const='release', help='build in release mode')
-    run_parser.add_argument('--debug', '-d', action='store_const', dest='buildtype', const='debug', help='build in debug mode')
-    run_parser.add_argument('args', nargs='*')
 
-    ide_parser = subparsers.add_parser('ide', help='generate a compile_commands.json compilation database')
-    ide_parser.add_argument('paths', nargs='*')
-
-    test_parser = subparsers.add_parser('test', help='run tests in the specified directories or files')
-    test_parser.add_argument('dirs', nargs='+')
+    def add_build_parser():
+        build_parser = subparsers.add_parser('build', help='build the specified binary or library')
+        build_parser.add_argument('path', help="path/to/file.cc")
+        build_parser.add_argument('--release', '-r', action='store_const', dest='buildtype', const='release', help='build in release mode')
+        build_parser.add_argument('--debug', '-d', action='store_const', dest='buildtype', const='debug', help='build in debug mode')
+        build_parser.add_argument('--library', action='store_true', help='build in library mode')
+        build_parser.add_argument('args', nargs='*')
+
+    def add_run_parser():
+        run_parser = subparsers.add_parser('run', help='run the specified binary')
+        run_parser.add_argument('path', help="path/to/file.cc")
+        run_parser.add_argument('--release', '-r', action='store_const', dest='buildtype', const='release', help='build in release mode')
+        run_parser.add_argument('--debug', '-d', action='store_const', dest='buildtype', const='debug', help='build in debug mode')
+        run_parser.add_argument('args', nargs='*')
+
+    def add_ide_parser():
+        ide_parser = subparsers.add_parser('ide', help='generate a compile_commands.json compilation database')
+        ide_parser.add_argument('paths', nargs='*')
+
+    def add_test_parser():
+        test_parser = subparsers.add_parser('test', help='run tests in the specified directories or files')
+        test_parser.add_argument('dirs', nargs='+')
+
+    parser_setup = {
+        'build': add_build_parser,
+        'run':   add_run_parser,
+        'ide':   add_ide_parser,
+        'test':  add_test_parser,
+    }
+
+    # subparser construction dominates short-command startup; build only
+    # the one the command line selects and fall back to all of them for
+    # the help/error paths
+    wanted = next((arg for arg in sys.argv[1:] if not arg.startswith('-')), None)
+    if wanted in parser_setup:
+        parser_setup[wanted]()
+    else:
+        for setup in parser_setup.values():
+            setup()
 
     args = parser.parse_args()
     if args.cmd in ['build', 'run']:
@@ -1009,22 +1995,33 @@ def main():
             buildcfg = Release
     
     if args.debug_log:
-        DEBUG_LOG = True
-
-    for key, val in buildcfg.__dict__.items():
-        if key.startswith('__'):
-            continue
-
-        globals()[key] = val
-
-    OBJDIR = Path(OBJDIR)
-    DEPDIR = Path(DEPDIR)
-    SRCDIR = Path(SRCDIR)
-    BINDIR = Path(BINDIR)
+        # the bare assignment this replaces only bound a function local
+        # and never actually enabled logging
+        enable_debug_log()
+
+    # explicit assignments: writing through globals()[key] in a loop
+    # defeats the LOAD_GLOBAL inline caches of every hot function that
+    # reads these names
+    CCFLAGS = buildcfg.ccflags
+    LFLAGS  = buildcfg.lflags
+    SUFFIX  = buildcfg.suffix
+
+    OBJDIR = buildcfg.objdir
+    DEPDIR = buildcfg.depdir
+
+    global CCACHE
+    CCACHE = shutil.which('ccache') or shutil.which('sccache')
+    if CCACHE:
+        # hits must survive the repo moving: hash paths relative to ROOT
+        os.environ.setdefault('CCACHE_BASEDIR', os.path.abspath(ROOT))
+        # mtime/ctime of unchanged headers and __TIME__ expansions must
+        # not defeat the preprocessed-source hash
+        os.environ.setdefault('CCACHE_SLOPPINESS',
+                              'time_macros,include_file_mtime,include_file_ctime')
 
     if args.cmd == 'build':
         file = args.path
-        target = Path(os.path.relpath(os.path.abspath(file), os.path.abspath(ROOT)))
+        target = mkpath(file)
         if ROOT != ".":
             os.chdir(ROOT)
         
@@ -1035,12 +2032,18 @@ def main():
     
     elif args.cmd == 'run':
         file = args.path
-        target = Path(os.path.relpath(os.path.abspath(file), os.path.abspath(ROOT)))
+        target = mkpath(file)
         oldwd = None
         if ROOT != ".":
             oldwd = os.getcwd()
             os.chdir(ROOT)
-        bin = os.path.abspath(build(target, TargetType.EXECUTABLE))
+        bin = os.fspath(build(target, TargetType.EXECUTABLE))
+        # anchor while still in ROOT; the chdir back is load-bearing
+        # (the program must start in the caller's directory)
+        if not os.path.isabs(bin):
+            bin = os.path.join(os.getcwd(), bin)
+        # flush while OBJDIR still resolves relative to ROOT
+        flush_caches()
         if oldwd:
             os.chdir(oldwd)
         os.execv(bin, [bin] + args.args)
@@ -1053,13 +2056,12 @@ def main():
             paths.append(SRCDIR)
 
         else:
+            # one getcwd for the whole loop
+            cwd = os.getcwd()
             for arg in args.paths:
-                file = arg
-                path = Path(os.path.relpath(os.path.abspath(file), os.path.abspath(ROOT)))
-                paths.append(path)
+                paths.append(mkpath(arg, cwd))
 
-        data = vscode(paths)
-        atomic_write(Path("compile_commands.json"), data)
+        vscode(paths, Path("compile_commands.json"))
         print("wrote compile_commands.json")
 
     elif args.cmd == "test":